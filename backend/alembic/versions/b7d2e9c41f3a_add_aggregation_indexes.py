@@ -0,0 +1,30 @@
+"""add aggregation indexes
+
+Revision ID: b7d2e9c41f3a
+Revises: 45266f790e4e
+Create Date: 2026-10-14 10:12:31.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e9c41f3a'
+down_revision: Union[str, None] = '45266f790e4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Expression index for the monthly GROUP BY strftime('%Y-%m', transaction_date)
+    op.create_index('ix_receipts_month', 'receipts', [sa.text("strftime('%Y-%m', transaction_date)")])
+    # Covering index for the per-vendor sum/count GROUP BY
+    op.create_index('ix_receipts_vendor_total_amount', 'receipts', ['vendor', 'total_amount'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receipts_vendor_total_amount', table_name='receipts')
+    op.drop_index('ix_receipts_month', table_name='receipts')
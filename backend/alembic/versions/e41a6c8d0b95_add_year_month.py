@@ -0,0 +1,33 @@
+"""add year_month
+
+Revision ID: e41a6c8d0b95
+Revises: b7d2e9c41f3a
+Create Date: 2026-10-14 11:40:07.215336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41a6c8d0b95'
+down_revision: Union[str, None] = 'b7d2e9c41f3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('year_month', sa.String(length=7), nullable=True))
+    # Backfill existing rows
+    op.execute("UPDATE receipts SET year_month = strftime('%Y-%m', transaction_date)")
+    op.create_index('ix_receipts_year_month_total_amount', 'receipts', ['year_month', 'total_amount'])
+    # The monthly GROUP BY no longer evaluates strftime
+    op.drop_index('ix_receipts_month', table_name='receipts')
+
+
+def downgrade() -> None:
+    op.create_index('ix_receipts_month', 'receipts', [sa.text("strftime('%Y-%m', transaction_date)")])
+    op.drop_index('ix_receipts_year_month_total_amount', table_name='receipts')
+    op.drop_column('receipts', 'year_month')
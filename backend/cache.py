@@ -0,0 +1,35 @@
+# cache.py
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# In-process cache for results derived from the receipts table.
+# Entries are stored as {name: (token, payload)}; a payload is only reused
+# while the caller presents the same token it was computed under.
+_lock = threading.Lock()
+_entries: Dict[str, Tuple[Hashable, Any]] = {}
+_epoch = 0
+
+def current_epoch() -> int:
+    """Returns the write epoch; include it in tokens so writes invalidate them."""
+    return _epoch
+
+def bump_epoch() -> None:
+    """Invalidates every cached entry. Call after receipts are added or removed."""
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _entries.clear()
+
+def get_or_compute(name: str, token: Hashable, compute: Callable[[], Any]) -> Any:
+    """
+    Returns the payload cached under name if it was computed with an equal
+    token, otherwise calls compute() and caches its result under token.
+    """
+    with _lock:
+        entry = _entries.get(name)
+    if entry is not None and entry[0] == token:
+        return entry[1]
+    payload = compute()
+    with _lock:
+        _entries[name] = (token, payload)
+    return payload
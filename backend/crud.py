@@ -1,9 +1,10 @@
 # crud.py
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, or_
-from typing import List, Optional, Dict
-import statistics
+from sqlalchemy import func, desc, asc, or_, insert, select
+from typing import List, Optional, Dict, Iterator
+from dataclasses import dataclass, field
 
+import cache
 import models
 import schemas
 from datetime import date
@@ -11,13 +12,36 @@ from datetime import date
 def get_receipt_by_id(db: Session, receipt_id: int):
     return db.query(models.Receipt).filter(models.Receipt.id == receipt_id).first()
 
+def _receipt_values(receipt: schemas.ReceiptCreate) -> dict:
+    """Column values for a new receipt, including the derived year_month."""
+    values = receipt.model_dump()
+    values["year_month"] = receipt.transaction_date.strftime("%Y-%m")
+    return values
+
 def create_receipt(db: Session, receipt: schemas.ReceiptCreate):
-    db_receipt = models.Receipt(**receipt.model_dump())
+    db_receipt = models.Receipt(**_receipt_values(receipt))
     db.add(db_receipt)
     db.commit()
     db.refresh(db_receipt)
+    cache.bump_epoch()
     return db_receipt
 
+def bulk_create_receipts(db: Session, receipts: List[schemas.ReceiptCreate]):
+    """
+    Inserts several receipts with a single multi-row INSERT ... RETURNING and
+    one commit. Returns the stored rows (without raw_text) in input order.
+    """
+    if not receipts:
+        return []
+    stmt = insert(models.Receipt).returning(
+        *(column for column in models.Receipt.__table__.c if column.name != "raw_text"),
+        sort_by_parameter_order=True
+    )
+    created = db.execute(stmt, [_receipt_values(receipt) for receipt in receipts]).all()
+    db.commit()
+    cache.bump_epoch()
+    return created
+
 def get_receipts(
     db: Session,
     skip: int = 0,
@@ -32,7 +56,24 @@ def get_receipts(
     sort_column = getattr(models.Receipt, sort_by, models.Receipt.transaction_date)
     order_func = desc if sort_order.lower() == "desc" else asc
 
-    return db.query(models.Receipt).order_by(order_func(sort_column)).offset(skip).limit(limit).all()
+    # raw_text is deferred on the model, so a page never carries the OCR text
+    stmt = select(models.Receipt).order_by(order_func(sort_column)).offset(skip).limit(limit)
+    return db.scalars(stmt).all()
+
+def iter_receipts_for_export(
+    db: Session,
+    fields: List[str],
+    batch_size: int = 1000
+) -> Iterator[tuple]:
+    """
+    Yields receipts as tuples of the requested columns, newest first.
+    Rows are fetched from the cursor in batches of batch_size, so memory use
+    stays constant no matter how many receipts are exported.
+    """
+    columns = [getattr(models.Receipt, name) for name in fields]
+    query = db.query(*columns).order_by(desc(models.Receipt.transaction_date))
+    for row in query.yield_per(batch_size):
+        yield tuple(row)
 
 def search_receipts(
     db: Session,
@@ -65,113 +106,179 @@ def search_receipts(
         
     return query.all()
 
-def get_aggregation_summary(db: Session) -> schemas.AggregationSummary:
+def _median_amount(db: Session, count: int) -> float:
     """
-    Computes statistical aggregates over the entire dataset.
+    Median of total_amount computed by SQLite.
+    Selects the middle one (odd count) or two (even count) values of the
+    ordered column with LIMIT/OFFSET and averages them, so only the middle
+    rows leave the database.
     """
-    receipts = db.query(models.Receipt).all()
-    if not receipts:
-        return schemas.AggregationSummary(
-            total_spend=0, receipt_count=0, average_spend=0, median_spend=0,
-            spend_by_vendor={}, spend_over_time={}
-        )
+    middle = db.query(models.Receipt.total_amount).order_by(
+        models.Receipt.total_amount
+    ).offset((count - 1) // 2).limit(2 - count % 2).subquery()
+    return db.query(func.avg(middle.c.total_amount)).scalar()
+
+# Number of vendors reported in the summary's top_vendors
+TOP_VENDOR_COUNT = 5
+
+@dataclass
+class ExpenseStats:
+    """All dashboard aggregates, computed together by _compute_all_stats."""
+    total_spend: float = 0.0
+    receipt_count: int = 0
+    average_spend: float = 0.0
+    median_spend: float = 0.0
+    mode_spend: float = 0.0
+    spend_by_vendor: Dict[str, float] = field(default_factory=dict)
+    top_vendors: List[schemas.VendorSpend] = field(default_factory=list)
+    visits_by_vendor: Dict[str, int] = field(default_factory=dict)
+    spend_by_month: Dict[str, float] = field(default_factory=dict)
+    monthly_trend: List[schemas.MonthlySpend] = field(default_factory=list)
+
+def _compute_all_stats(db: Session) -> ExpenseStats:
+    """
+    Runs every aggregate the dashboard endpoints need back-to-back on one
+    session: scalar totals, median, mode, monthly sums and per-vendor
+    sums/counts. Each query is evaluated by SQLite and returns one row per
+    bucket at most.
+    """
+    total_spend, average_spend, receipt_count = db.query(
+        func.sum(models.Receipt.total_amount),
+        func.avg(models.Receipt.total_amount),
+        func.count(models.Receipt.id)
+    ).one()
+    if not receipt_count:
+        return ExpenseStats()
 
-    amounts = [r.total_amount for r in receipts]
+    # Mode: most frequent amount; ties go to the amount stored first,
+    # matching statistics.mode over rows in insertion order.
+    mode_spend, _ = db.query(
+        models.Receipt.total_amount,
+        func.count(models.Receipt.id).label("frequency")
+    ).group_by(models.Receipt.total_amount).order_by(
+        desc("frequency"), func.min(models.Receipt.id)
+    ).first()
 
-    # Time-series aggregation (monthly spend)
+    # Time-series aggregation (monthly spend), with the 3-month moving
+    # average computed by a window over the grouped rows
+    monthly_total = func.sum(models.Receipt.total_amount)
     monthly_spend_query = db.query(
-        func.strftime('%Y-%m', models.Receipt.transaction_date).label('month'),
-        func.sum(models.Receipt.total_amount)
-    ).group_by('month').order_by('month').all()
-    
-    spend_over_time = {month: total for month, total in monthly_spend_query}
+        models.Receipt.year_month,
+        monthly_total,
+        func.avg(monthly_total).over(order_by=models.Receipt.year_month, rows=(-2, 0))
+    ).group_by(models.Receipt.year_month).order_by(models.Receipt.year_month).all()
 
-    # Frequency distribution (spend by vendor)
-    vendor_spend_query = db.query(
+    # Frequency distribution (spend and visits by vendor), biggest spend
+    # first so the top vendors are the leading rows
+    vendor_spend = func.sum(models.Receipt.total_amount)
+    vendor_query = db.query(
         models.Receipt.vendor,
-        func.sum(models.Receipt.total_amount)
-    ).group_by(models.Receipt.vendor).all()
+        vendor_spend,
+        func.count(models.Receipt.id)
+    ).group_by(models.Receipt.vendor).order_by(desc(vendor_spend), models.Receipt.vendor).all()
+
+    return ExpenseStats(
+        total_spend=total_spend,
+        receipt_count=receipt_count,
+        average_spend=average_spend,
+        median_spend=_median_amount(db, receipt_count),
+        mode_spend=mode_spend,
+        spend_by_vendor={vendor: total for vendor, total, _ in vendor_query},
+        top_vendors=[
+            schemas.VendorSpend(vendor=vendor, total=total)
+            for vendor, total, _ in vendor_query[:TOP_VENDOR_COUNT]
+        ],
+        visits_by_vendor={vendor: visits for vendor, _, visits in vendor_query},
+        spend_by_month={month: total for month, total, _ in monthly_spend_query},
+        monthly_trend=[
+            schemas.MonthlySpend(month=month, total=total, ma3=ma3)
+            for month, total, ma3 in monthly_spend_query
+        ],
+    )
 
-    spend_by_vendor = {vendor: total for vendor, total in vendor_spend_query}
+def get_stats_token(db: Session) -> tuple:
+    """
+    Cheap fingerprint of the receipts table used to validate cached aggregates.
+    The write epoch covers changes made through this process; MAX/COUNT
+    also catch writes made by other workers.
+    """
+    newest, count = db.query(
+        func.max(models.Receipt.created_at),
+        func.count(models.Receipt.id)
+    ).one()
+    return (cache.current_epoch(), newest, count)
 
+def get_all_stats(db: Session) -> ExpenseStats:
+    """
+    Returns the dashboard aggregates, reusing the cached result while the
+    stats token is unchanged. A cache hit costs one MAX/COUNT query.
+    """
+    return cache.get_or_compute(
+        "all_stats", get_stats_token(db), lambda: _compute_all_stats(db)
+    )
+
+def _summary_of(stats: ExpenseStats) -> schemas.AggregationSummary:
     return schemas.AggregationSummary(
-        total_spend=sum(amounts),
-        receipt_count=len(amounts),
-        average_spend=statistics.mean(amounts),
-        median_spend=statistics.median(amounts),
-        spend_by_vendor=spend_by_vendor,
-        spend_over_time=spend_over_time,
+        total_spend=stats.total_spend,
+        receipt_count=stats.receipt_count,
+        average_spend=stats.average_spend,
+        median_spend=stats.median_spend,
+        spend_by_vendor=stats.spend_by_vendor,
+        top_vendors=stats.top_vendors,
+        spend_over_time=stats.spend_by_month,
     )
 
+def _statistics_of(stats: ExpenseStats) -> Dict[str, float]:
+    return {
+        "sum": stats.total_spend,
+        "mean": stats.average_spend,
+        "median": stats.median_spend,
+        "mode": stats.mode_spend
+    }
+
+def get_aggregation_summary(db: Session) -> schemas.AggregationSummary:
+    """
+    Computes statistical aggregates over the entire dataset.
+    """
+    return _summary_of(get_all_stats(db))
+
 def get_expense_statistics(db: Session) -> Dict[str, float]:
     """
     Calculate various statistics on the receipts' total_amount.
     Returns a dictionary with keys: 'sum', 'mean', 'median', 'mode'.
     """
-    # Get all total amounts
-    amounts = [receipt.total_amount for receipt in db.query(models.Receipt).all()]
-    
-    if not amounts:
-        return {"sum": 0.0, "mean": 0.0, "median": 0.0, "mode": 0.0}
-    
-    # Calculate sum
-    total = sum(amounts)
-    
-    # Calculate mean
-    mean = total / len(amounts)
-    
-    # Calculate median
-    sorted_amounts = sorted(amounts)
-    n = len(sorted_amounts)
-    mid = n // 2
-    if n % 2 == 0:
-        median = (sorted_amounts[mid-1] + sorted_amounts[mid]) / 2
-    else:
-        median = sorted_amounts[mid]
-    
-    # Calculate mode
-    from statistics import mode
-    try:
-        mode_val = mode(amounts)
-    except statistics.StatisticsError:
-        # If there is no unique mode, use the first element
-        mode_val = amounts[0] if amounts else 0.0
-    
-    return {
-        "sum": total,
-        "mean": mean,
-        "median": median,
-        "mode": mode_val
-    }
+    return _statistics_of(get_all_stats(db))
 
 def get_vendor_frequencies(db: Session) -> Dict[str, int]:
     """
     Returns a dictionary of vendor names and their occurrence counts
     """
-    from collections import defaultdict
-    vendor_counts = defaultdict(int)
-    receipts = db.query(models.Receipt).all()
-    for receipt in receipts:
-        vendor_counts[receipt.vendor] += 1
-    return dict(vendor_counts)
+    return get_all_stats(db).visits_by_vendor
+
+def get_monthly_spend(db: Session) -> List[schemas.MonthlySpend]:
+    """
+    Returns monthly total spend and its 3-month moving average, sorted by
+    YYYY-MM month
+    """
+    return get_all_stats(db).monthly_trend
 
-def get_monthly_spend(db: Session) -> Dict[str, float]:
+def get_dashboard_bundle(db: Session) -> schemas.DashboardBundle:
     """
-    Returns monthly total spend as a dictionary of YYYY-MM: amount
+    Returns the summary, statistics, monthly spend and vendor frequencies
+    together, from a single get_all_stats call.
     """
-    from collections import defaultdict
-    from datetime import datetime
-    monthly_totals = defaultdict(float)
-    receipts = db.query(models.Receipt).all()
-    for receipt in receipts:
-        if receipt.transaction_date:
-            month_key = receipt.transaction_date.strftime("%Y-%m")
-            monthly_totals[month_key] += receipt.total_amount
-    return dict(monthly_totals)
+    stats = get_all_stats(db)
+    return schemas.DashboardBundle(
+        summary=_summary_of(stats),
+        stats=_statistics_of(stats),
+        monthly=stats.monthly_trend,
+        vendor_freq=stats.visits_by_vendor,
+    )
 
 def delete_receipt(db: Session, receipt_id: int):
     db_receipt = get_receipt_by_id(db, receipt_id)
     if db_receipt:
         db.delete(db_receipt)
         db.commit()
+        cache.bump_epoch()
     return db_receipt
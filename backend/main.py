@@ -1,14 +1,16 @@
 # main.py
-from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, status, Query, Response
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict
 from datetime import date
 import logging
 
+import orjson
+
 import crud, models, schemas, parsing
-from database import engine, get_db
+from database import SessionLocal, engine, get_db
 
 # Create all database tables on startup
 models.Base.metadata.create_all(bind=engine)
@@ -29,6 +31,14 @@ app.add_middleware(
 
 logger = logging.getLogger(__name__)
 
+# Columns written by the export endpoints, in output order
+EXPORT_FIELDS = ["id", "vendor", "transaction_date", "total_amount", "category", "raw_text", "original_filename"]
+EXPORT_BATCH_SIZE = 1000
+
+def _export_fields(include_raw: bool) -> List[str]:
+    """Export columns, leaving out the large raw_text column unless requested."""
+    return [name for name in EXPORT_FIELDS if include_raw or name != "raw_text"]
+
 @app.post("/receipts/upload", response_model=List[schemas.ReceiptResponse], status_code=status.HTTP_201_CREATED)
 async def upload_and_process_receipt(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
@@ -63,10 +73,9 @@ async def upload_and_process_receipt(file: UploadFile = File(...), db: Session =
             detail="Failed to parse any structured data from the document."
         )
 
-    created_receipts = []
-    for receipt_data in parsed_receipts:
-        # Step 5: Create ReceiptCreate object for each receipt
-        receipt_to_create = schemas.ReceiptCreate(
+    # Step 5: Create ReceiptCreate objects for each receipt
+    receipts_to_create = [
+        schemas.ReceiptCreate(
             vendor=receipt_data["vendor"],
             transaction_date=receipt_data["transaction_date"],
             total_amount=receipt_data["total_amount"],
@@ -74,12 +83,11 @@ async def upload_and_process_receipt(file: UploadFile = File(...), db: Session =
             raw_text=receipt_data.get("raw_text", ""),
             original_filename=file.filename
         )
-        
-        # Step 6: Pass to CRUD layer and collect the result
-        created_receipt = crud.create_receipt(db=db, receipt=receipt_to_create)
-        created_receipts.append(created_receipt)
+        for receipt_data in parsed_receipts
+    ]
 
-    return created_receipts
+    # Step 6: Store them in one batch through the CRUD layer
+    return crud.bulk_create_receipts(db=db, receipts=receipts_to_create)
 
 
 @app.get("/receipts", response_model=List[schemas.ReceiptResponse])
@@ -147,73 +155,84 @@ def get_vendor_frequencies(db: Session = Depends(get_db)):
     """
     return crud.get_vendor_frequencies(db=db)
 
-@app.get("/receipts/monthly-spend", response_model=Dict[str, float])
+@app.get("/receipts/monthly-spend", response_model=List[schemas.MonthlySpend])
 def get_monthly_spend(db: Session = Depends(get_db)):
     """
-    Returns monthly total spend
+    Returns monthly total spend and 3-month moving average, sorted by month
     """
     return crud.get_monthly_spend(db=db)
 
-@app.get("/receipts/export-csv")
-def export_receipts_csv(db: Session = Depends(get_db)):
+@app.get("/receipts/dashboard-bundle", response_model=schemas.DashboardBundle)
+def get_dashboard_bundle(db: Session = Depends(get_db)):
     """
-    Exports all receipts as CSV
+    Returns summary, statistics, monthly spend and vendor frequencies in one
+    response, so the dashboard needs a single request
     """
-    receipts = crud.get_receipts(db, skip=0, limit=1000000)
-    
-    # Create CSV content
-    import csv
-    from io import StringIO
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(["id", "vendor", "transaction_date", "total_amount", "category", "raw_text", "original_filename"])
-    
-    # Write rows
-    for receipt in receipts:
-        writer.writerow([
-            receipt.id,
-            receipt.vendor,
-            receipt.transaction_date,
-            receipt.total_amount,
-            receipt.category,
-            receipt.raw_text,
-            receipt.original_filename
-        ])
-    
+    return crud.get_dashboard_bundle(db=db)
+
+@app.get("/receipts/export-csv")
+def export_receipts_csv(include_raw: bool = False):
+    """
+    Exports all receipts as CSV, streamed in batches.
+    The OCR text column is only included with ?include_raw=true.
+    """
+    fields = _export_fields(include_raw)
+
+    def row_iter():
+        import csv
+        from io import StringIO
+
+        # The stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        try:
+            output = StringIO()
+            writer = csv.writer(output)
+            writer.writerow(fields)
+            for count, row in enumerate(crud.iter_receipts_for_export(db, fields, EXPORT_BATCH_SIZE), 1):
+                writer.writerow(row)
+                if count % EXPORT_BATCH_SIZE == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+            yield output.getvalue()
+        finally:
+            db.close()
+
     # Return as downloadable file
-    return Response(
-        content=output.getvalue(),
+    return StreamingResponse(
+        row_iter(),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=receipts_export.csv"}
     )
 
 @app.get("/receipts/export-json")
-def export_receipts_json(db: Session = Depends(get_db)):
-    """
-    Exports all receipts as JSON
-    """
-    receipts = crud.get_receipts(db, skip=0, limit=1000000)
-    
-    # Convert to list of dictionaries
-    receipts_dict = [
-        {
-            "id": r.id,
-            "vendor": r.vendor,
-            "transaction_date": str(r.transaction_date),
-            "total_amount": r.total_amount,
-            "category": r.category,
-            "raw_text": r.raw_text,
-            "original_filename": r.original_filename
-        }
-        for r in receipts
-    ]
-    
+def export_receipts_json(include_raw: bool = False):
+    """
+    Exports all receipts as a JSON array, streamed in batches.
+    The OCR text field is only included with ?include_raw=true.
+    """
+    fields = _export_fields(include_raw)
+
+    def row_iter():
+        # The stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        try:
+            chunk = [b"["]
+            for count, row in enumerate(crud.iter_receipts_for_export(db, fields, EXPORT_BATCH_SIZE)):
+                if count:
+                    chunk.append(b",")
+                chunk.append(orjson.dumps(dict(zip(fields, row))))
+                if (count + 1) % EXPORT_BATCH_SIZE == 0:
+                    yield b"".join(chunk)
+                    chunk = []
+            chunk.append(b"]")
+            yield b"".join(chunk)
+        finally:
+            db.close()
+
     # Return as downloadable file
-    return JSONResponse(
-        content=receipts_dict,
+    return StreamingResponse(
+        row_iter(),
         media_type="application/json",
         headers={"Content-Disposition": "attachment; filename=receipts_export.json"}
-    )
\ No newline at end of file
+    )
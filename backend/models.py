@@ -1,5 +1,6 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Float, Date, Text, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, Text, DateTime, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from database import Base
 
@@ -11,7 +12,16 @@ class Receipt(Base):
     transaction_date = Column(Date, index=True, nullable=False)
     total_amount = Column(Float, index=True, nullable=False)
     category = Column(String, nullable=True)
-    raw_text = Column(Text, nullable=True)
+    # Large OCR text; only loaded when the attribute is accessed
+    raw_text = deferred(Column(Text, nullable=True))
     original_filename = Column(String, nullable=True)
     currency = Column(String, default="INR")  # Default to Indian Rupee
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # YYYY-MM of transaction_date, stored on insert for the monthly GROUP BY
+    year_month = Column(String(7), nullable=True)
+
+    __table_args__ = (
+        # Covering indexes for the monthly and per-vendor aggregations
+        Index("ix_receipts_year_month_total_amount", "year_month", "total_amount"),
+        Index("ix_receipts_vendor_total_amount", "vendor", "total_amount"),
+    )
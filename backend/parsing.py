@@ -1,12 +1,13 @@
 # parsing.py
 import re
 import io
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, date
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List
 
-import pytesseract
-from PIL import Image
-import pdfplumber
 from fastapi import UploadFile, HTTPException, status
 
 # --- Rule-Based Parsing Logic ---
@@ -43,19 +44,43 @@ PATTERNS = {
     ]
 }
 
+# Currency symbol directly followed by an amount, e.g. "₹1,200.00" or "Rs. 250"
+CURRENCY_RE = re.compile(r"(\$|€|£|¥|₹|Rs\.?)\s*([\d,]+(?:\.[\d]{2})?)")
+CURRENCY_CODES = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY"} # ₹ and Rs fall back to INR
+CURRENCY_MARKERS = ("$", "€", "£", "¥", "₹", "Rs")
+
+# Receipts within one document are separated by a line of '---' or '==='
+CHUNK_SEPARATOR_RE = re.compile(r'\n-[-]{2,}\n|\n=[=]{2,}\n')
+
+# An all-caps line is the most reliable vendor name and is checked first
+ALL_CAPS_VENDOR_RE = re.compile(r"^([A-Z\s&]+)$", re.MULTILINE)
+
+# Characters dropped from an amount before conversion
+AMOUNT_STRIP_TABLE = str.maketrans("", "", ",₹")
+
 def clean_amount(amount_str: str) -> float:
     """Removes currency symbols, commas and converts to float."""
-    return float(amount_str.replace(",", "").replace("₹", "").strip())
+    return float(amount_str.translate(AMOUNT_STRIP_TABLE))
 
 def clean_date(date_str: str) -> Optional[date]:
-    """Tries to parse a date string from multiple formats."""
-    formats_to_try = ["%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y", "%d.%m.%Y"]
-    for fmt in formats_to_try:
-        try:
-            return datetime.strptime(date_str.strip(), fmt).date()
-        except ValueError:
-            continue
-    return None # Return None if no format matches
+    """
+    Parses a date string in one of the formats the date patterns capture:
+    DD/MM/YYYY, DD-MM-YYYY, DD-Mon-YYYY or DD.MM.YYYY.
+    The format is picked from the string's shape so only one parse is tried.
+    """
+    date_str = date_str.strip()
+    if "/" in date_str:
+        fmt = "%d/%m/%Y"
+    elif "." in date_str:
+        fmt = "%d.%m.%Y"
+    elif any(char.isalpha() for char in date_str):
+        fmt = "%d-%b-%Y"
+    else:
+        fmt = "%d-%m-%Y"
+    try:
+        return datetime.strptime(date_str, fmt).date()
+    except ValueError:
+        return None # Return None if the string does not fit the format
 
 def extract_structured_data(text: str) -> List[Dict]:
     """
@@ -65,7 +90,7 @@ def extract_structured_data(text: str) -> List[Dict]:
     receipts = []
     # Split the text into chunks, assuming each chunk is one receipt
     # This is a simple heuristic and might need to be more robust
-    chunks = re.split(r'\n-[-]{2,}\n|\n=[=]{2,}\n', text)
+    chunks = CHUNK_SEPARATOR_RE.split(text)
 
     for chunk in chunks:
         if not chunk.strip():
@@ -78,8 +103,7 @@ def extract_structured_data(text: str) -> List[Dict]:
             # Special handling for vendor to prioritize all-caps title
             if field == 'vendor':
                 # Check for all-caps vendor first
-                all_caps_pattern = re.compile(r"^([A-Z\s&]+)$", re.MULTILINE)
-                match = all_caps_pattern.search(chunk)
+                match = ALL_CAPS_VENDOR_RE.search(chunk)
                 if match:
                     extracted['vendor'] = match.group(1).strip()
                     # If found, we can be confident and skip other vendor patterns
@@ -112,21 +136,12 @@ def extract_structured_data(text: str) -> List[Dict]:
                 extracted["category"] = category
                 break
         
-        # Currency detection
-        currency_pattern = re.compile(r"(?:\$|€|£|¥|₹|Rs\.?)\s*([\d,]+(?:\.[\d]{2})?)")
-        currency_match = currency_pattern.search(chunk)
+        # Currency detection: skip the regex when no currency marker is present
         currency = "INR"  # Default
-        if currency_match:
-            if "$" in currency_match.group(0):
-                currency = "USD"
-            elif "€" in currency_match.group(0):
-                currency = "EUR"
-            elif "£" in currency_match.group(0):
-                currency = "GBP"
-            elif "¥" in currency_match.group(0):
-                currency = "JPY"
-            elif "₹" in currency_match.group(0) or "Rs" in currency_match.group(0):
-                currency = "INR"
+        if any(marker in chunk for marker in CURRENCY_MARKERS):
+            currency_match = CURRENCY_RE.search(chunk)
+            if currency_match:
+                currency = CURRENCY_CODES.get(currency_match.group(1), "INR")
         
         receipts.append({
             "vendor": extracted.get("vendor"),
@@ -140,10 +155,54 @@ def extract_structured_data(text: str) -> List[Dict]:
     return receipts
 
 
+# --- Extracted text cache ---
+
+# Text extracted from images and PDFs, keyed by (kind, content digest), so
+# re-uploading an identical file skips OCR. Least recently used entries are
+# evicted beyond OCR_CACHE_SIZE.
+OCR_CACHE_SIZE = 512
+_ocr_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+def _cached_extract(kind: str, contents: bytes, extract: Callable[[bytes], str]) -> str:
+    """Returns extract(contents), reusing the cached text for identical files."""
+    key = (kind, hashlib.blake2b(contents, digest_size=16).digest())
+    with _ocr_cache_lock:
+        text = _ocr_cache.get(key)
+        if text is not None:
+            _ocr_cache.move_to_end(key)
+            return text
+    text = extract(contents)
+    with _ocr_cache_lock:
+        _ocr_cache[key] = text
+        if len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+    return text
+
+def _ocr_image(contents: bytes) -> str:
+    """Runs Tesseract OCR over an image file's bytes."""
+    # Imported on first use so workers serving only the read API never load them
+    import pytesseract
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(contents))
+    return pytesseract.image_to_string(image)
+
+def _extract_pdf_text(contents: bytes) -> str:
+    """Extracts the text layer of every page of a PDF file's bytes."""
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(contents)) as pdf:
+        # One line break between pages keeps the last line of a page from
+        # running into the first line of the next
+        return "\n".join(page.extract_text() or "" for page in pdf.pages)
+
 async def process_file_to_text(file: UploadFile) -> str:
     """
     Processes an uploaded file to extract text.
     Supports: .txt, .jpg, .png, .pdf
+    OCR and PDF parsing are blocking, so they run in a worker thread to keep
+    the event loop free for other requests.
     """
     # Read the file content
     contents = await file.read()
@@ -159,16 +218,10 @@ async def process_file_to_text(file: UploadFile) -> str:
         return contents.decode("utf-8")
     elif extension in ["jpg", "jpeg", "png"]:
         # Use OCR for images
-        image = Image.open(io.BytesIO(contents))
-        text = pytesseract.image_to_string(image)
-        return text
+        return await asyncio.to_thread(_cached_extract, "image", contents, _ocr_image)
     elif extension == "pdf":
         # Use pdfplumber for PDFs
-        text = ""
-        with pdfplumber.open(io.BytesIO(contents)) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-        return text
+        return await asyncio.to_thread(_cached_extract, "pdf", contents, _extract_pdf_text)
     else:
         # Unsupported file type
         raise HTTPException(
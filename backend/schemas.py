@@ -1,7 +1,7 @@
 # schemas.py
 from pydantic import BaseModel
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 # Base schema with common fields
 class ReceiptBase(BaseModel):
@@ -24,11 +24,30 @@ class ReceiptResponse(ReceiptBase):
     class Config:
         from_attributes = True # Pydantic v2, was orm_mode=True
 
+# Schema for one vendor's total spend
+class VendorSpend(BaseModel):
+    vendor: str
+    total: float
+
 # Schema for the aggregation/summary endpoint
 class AggregationSummary(BaseModel):
     total_spend: float
     receipt_count: int
     average_spend: float
     median_spend: float
-    spend_by_vendor: dict
-    spend_over_time: dict # e.g., {"2025-07": 1500.50}
+    spend_by_vendor: Dict[str, float]
+    top_vendors: List[VendorSpend] # highest spend first
+    spend_over_time: Dict[str, float] # e.g., {"2025-07": 1500.50}
+
+# Schema for one month of the monthly-spend trend
+class MonthlySpend(BaseModel):
+    month: str # e.g., "2025-07"
+    total: float
+    ma3: float # 3-month moving average ending at this month
+
+# Schema for the combined dashboard endpoint
+class DashboardBundle(BaseModel):
+    summary: AggregationSummary
+    stats: Dict[str, float]
+    monthly: List[MonthlySpend]
+    vendor_freq: Dict[str, int]
@@ -1,12 +1,12 @@
 import streamlit as st
 import requests
-import pandas as pd
-import plotly.express as px
-import matplotlib.pyplot as plt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import os
 
+
 # --- Configuration ---
 st.set_page_config(
     page_title="Receipt Analyzer",
@@ -16,55 +16,101 @@ st.set_page_config(
 
 API_BASE_URL = "http://127.0.0.1:8000"
 
+# How long fetched API data is reused across reruns before it is requested again
+CACHE_TTL_SECONDS = 60
+
+# Number of receipts fetched per page in the Browse tab
+RECEIPTS_PAGE_SIZE = 20
+
+# Chunk size for reading export downloads off the socket
+EXPORT_CHUNK_SIZE = 64 * 1024
+
 # --- Helper Functions ---
+@st.cache_resource
+def get_session():
+    """Shared HTTP session, created once per process: keeps connections to the
+    backend alive between calls, with enough pooled sockets for concurrent requests."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.1)))
+    return session
+
+@st.cache_resource
+def get_pool():
+    """Worker threads, created once per process, for issuing independent API calls (e.g. bulk deletes) concurrently."""
+    return ThreadPoolExecutor(max_workers=8)
+
+def invalidate_receipt_data():
+    """Drops cached API data and prepared exports after receipts are added or deleted."""
+    # Only the fetchers whose responses depend on the stored receipts; chart
+    # figures are keyed by their payload and the stylesheet never changes
+    _get_json.clear()
+    _fetch_export.clear()
+    st.session_state.pop("csv_blob", None)
+    st.session_state.pop("json_blob", None)
+
+@st.cache_resource
+def _load_css(file_path):
+    """Reads a stylesheet once per process."""
+    with open(file_path) as f:
+        return f.read()
+
 def local_css(file_name):
     # Construct path to be relative to the script's location
     script_dir = os.path.dirname(os.path.abspath(__file__))
     file_path = os.path.join(script_dir, file_name)
-    with open(file_path) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    st.markdown(f'<style>{_load_css(file_path)}</style>', unsafe_allow_html=True)
+
+# Cached fetchers raise on failure, so only successful responses are memoized;
+# the public wrappers below report errors and return a fallback each run
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _get_json(path, params=None):
+    """GETs an API path and returns the decoded JSON body."""
+    response = get_session().get(f"{API_BASE_URL}{path}", params=params)
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_export(path):
+    """Reads a streamed export response in 64 KiB chunks."""
+    with get_session().get(f"{API_BASE_URL}{path}", stream=True) as response:
+        response.raise_for_status()
+        return b"".join(response.iter_content(EXPORT_CHUNK_SIZE))
 
-def get_all_receipts(sort_by="transaction_date", sort_order="desc"):
-    """Fetches all receipts from the backend."""
+def get_all_receipts(sort_by="transaction_date", sort_order="desc", page=1):
+    """Fetches one page of receipts from the backend."""
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/receipts",
-            params={"sort_by": sort_by, "sort_order": sort_order, "limit": 100}
-        )
-        response.raise_for_status()
-        return response.json()
+        return _get_json("/receipts", {
+            "sort_by": sort_by,
+            "sort_order": sort_order,
+            "skip": (page - 1) * RECEIPTS_PAGE_SIZE,
+            "limit": RECEIPTS_PAGE_SIZE
+        })
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to API: {e}")
         return []
 
-def get_summary_data():
-    """Fetches aggregation summary from the backend."""
+def get_dashboard_bundle():
+    """Fetches summary, statistics, monthly spend and vendor frequencies in one request."""
     try:
-        response = requests.get(f"{API_BASE_URL}/receipts/summary")
-        response.raise_for_status()
-        return response.json()
+        return _get_json("/receipts/dashboard-bundle")
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to API: {e}")
         return None
 
-def get_stats_data():
-    """Fetches expense statistics from the backend."""
+def get_export_csv():
+    """Fetches the CSV export file from the backend."""
     try:
-        response = requests.get(f"{API_BASE_URL}/receipts/statistics")
-        response.raise_for_status()
-        return response.json()
+        return _fetch_export("/receipts/export-csv")
     except requests.exceptions.RequestException as e:
-        st.error(f"Error connecting to API for stats: {e}")
+        st.error(f"Error connecting to API for CSV export: {e}")
         return None
 
-def get_monthly_spend_data():
-    """Fetches monthly spend data from the backend."""
+def get_export_json():
+    """Fetches the JSON export file from the backend."""
     try:
-        response = requests.get(f"{API_BASE_URL}/receipts/monthly-spend")
-        response.raise_for_status()
-        return response.json()
+        return _fetch_export("/receipts/export-json")
     except requests.exceptions.RequestException as e:
-        st.error(f"Error connecting to API for monthly spend: {e}")
+        st.error(f"Error connecting to API for JSON export: {e}")
         return None
 
 def search_receipts(keyword: str, start_date: Optional[str], end_date: Optional[str]):
@@ -83,40 +129,107 @@ def search_receipts(keyword: str, start_date: Optional[str], end_date: Optional[
             # This allows the 'Clear Search' to function smoothly
             return []
 
-        response = requests.get(f"{API_BASE_URL}/receipts/search", params=params)
-        response.raise_for_status()
-        return response.json()
+        return _get_json("/receipts/search", params)
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to API: {e}")
         return []
 
+# --- Chart Builders ---
+# Cached on the payload they are drawn from, so an unchanged dashboard
+# reuses the built figures instead of laying them out again on every rerun
+# pandas and Plotly are imported inside the builders (and where the Browse
+# tab needs pandas), so starting the app or using the Upload tab doesn't load them
+@st.cache_data(show_spinner=False)
+def _bar_vendor_freq(vendor_freq: dict):
+    import pandas as pd
+    import plotly.express as px
+
+    freq_df = pd.DataFrame(list(vendor_freq.items()), columns=['Vendor', 'Count'])
+    return px.bar(freq_df, x='Vendor', y='Count', title="Number of Visits per Vendor")
+
+@st.cache_data(show_spinner=False)
+def _pie_spend(spend_by_vendor: dict):
+    import pandas as pd
+    import plotly.express as px
+
+    vendor_spend_df = pd.DataFrame(list(spend_by_vendor.items()), columns=['Vendor', 'Total Spend'])
+    color_sequence = ["#1ABC9C", "#3498DB", "#F1C40F", "#E67E22", "#9B59B6", "#2C3E50"]
+    fig = px.pie(vendor_spend_df, values='Total Spend', names='Vendor', title='Spend by Vendor', color_discrete_sequence=color_sequence)
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font_color='#E2E8F0',
+        legend_title_text=''
+    )
+    return fig
+
+@st.cache_data(show_spinner=False)
+def _bar_top5(top_vendors: list):
+    import pandas as pd
+    import plotly.express as px
+
+    # Already the five biggest vendors, highest spend first
+    top_5_vendors = pd.DataFrame(top_vendors).rename(columns={'vendor': 'Vendor', 'total': 'Total Spend'})
+    fig = px.bar(top_5_vendors, x='Total Spend', y='Vendor', orientation='h')
+    fig.update_traces(marker_color='#1ABC9C') # Turquoise bars
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font_color='#E2E8F0',
+        xaxis_title="Total Spend (₹)",
+        yaxis_title=""
+    )
+    return fig
+
+@st.cache_data(show_spinner=False)
+def _line_monthly(monthly_spend: list):
+    import pandas as pd
+    import plotly.express as px
+
+    # Months arrive sorted, with the moving average already computed by the backend
+    monthly_df = pd.DataFrame(monthly_spend).rename(
+        columns={'month': 'Month', 'total': 'Total Spend', 'ma3': 'Moving Average (3M)'}
+    )
+
+    # Create plot with new 'Deep Ocean' color scheme and dark theme layout
+    fig = px.line(monthly_df, x='Month', y=['Total Spend', 'Moving Average (3M)'], 
+                  title="Monthly Expenditure and Trend", markers=True,
+                  color_discrete_map={
+                      'Total Spend': '#3498DB', # Peter River Blue
+                      'Moving Average (3M)': '#1ABC9C' # Turquoise
+                  })
+    fig.update_layout(
+        yaxis_title="Total Spend (₹)", 
+        legend_title_text='',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font_color='#E2E8F0'
+    )
+    return fig
+
 # --- Main Application UI ---
 local_css("style.css")
 
 st.title("🧾 Receipt Analyzer")
 st.markdown("Upload, analyze, and visualize your spending from receipts and bills.")
 
-tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "📤 Upload New Receipt", "🔍 Browse & Search"])
+# Only the selected section runs on a rerun, so uploading or browsing never
+# pays for the dashboard's API calls (st.tabs would execute all three)
+TAB_DASHBOARD, TAB_UPLOAD, TAB_BROWSE = "📊 Dashboard", "📤 Upload New Receipt", "🔍 Browse & Search"
+active_tab = st.radio(
+    "Section", [TAB_DASHBOARD, TAB_UPLOAD, TAB_BROWSE],
+    horizontal=True, key="active_tab", label_visibility="collapsed"
+)
 
 # --- Tab 1: Dashboard & Analytics ---
-with tab1:
+if active_tab == TAB_DASHBOARD:
     st.header("Spending Analysis Dashboard")
-    summary_data = get_summary_data()
-    stats_data = get_stats_data()
-    monthly_spend_data = get_monthly_spend_data()
+    bundle = get_dashboard_bundle() or {}
+    summary_data = bundle.get("summary")
+    stats_data = bundle.get("stats")
+    monthly_spend_data = bundle.get("monthly")
 
     if summary_data and summary_data['receipt_count'] > 0:
-        # --- Filters ---
-        # In a real scenario, you'd connect these to filter the data.
-        # For now, they are placeholders.
-        c1, c2 = st.columns(2)
-        with c1:
-            st.date_input("Event Date", (datetime(2023, 9, 28), datetime(2023, 10, 18)))
-        with c2:
-            st.selectbox("Events", ["All"])
-
-        st.divider()
-
         # --- Main Layout ---
         col_left, col_right = st.columns([1, 1.2])
 
@@ -133,11 +246,9 @@ with tab1:
             # --- Vendor Frequency Chart ---
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.subheader("Vendor Frequency")
-            vendor_freq = requests.get(f"{API_BASE_URL}/receipts/vendor-frequencies").json()
+            vendor_freq = bundle.get("vendor_freq")
             if vendor_freq:
-                freq_df = pd.DataFrame(list(vendor_freq.items()), columns=['Vendor', 'Count'])
-                fig = px.bar(freq_df, x='Vendor', y='Count', title="Number of Visits per Vendor")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(_bar_vendor_freq(vendor_freq), use_container_width=True)
             else:
                 st.info("No vendor frequency data available.")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -148,16 +259,7 @@ with tab1:
             st.subheader("Spend by Vendor")
             spend_by_vendor = summary_data.get("spend_by_vendor", {})
             if spend_by_vendor:
-                vendor_spend_df = pd.DataFrame(list(spend_by_vendor.items()), columns=['Vendor', 'Total Spend'])
-                color_sequence = ["#1ABC9C", "#3498DB", "#F1C40F", "#E67E22", "#9B59B6", "#2C3E50"]
-                fig = px.pie(vendor_spend_df, values='Total Spend', names='Vendor', title='Spend by Vendor', color_discrete_sequence=color_sequence)
-                fig.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font_color='#E2E8F0',
-                    legend_title_text=''
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(_pie_spend(spend_by_vendor), use_container_width=True)
             else:
                 st.info("No vendor data to display.")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -165,18 +267,9 @@ with tab1:
             # --- Top 5 Vendors by Spend ---
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.subheader("Top 5 Vendors by Spend")
-            if spend_by_vendor:
-                top_5_vendors = vendor_spend_df.nlargest(5, 'Total Spend')
-                fig_top_vendors = px.bar(top_5_vendors, x='Total Spend', y='Vendor', orientation='h')
-                fig_top_vendors.update_traces(marker_color='#1ABC9C') # Turquoise bars
-                fig_top_vendors.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font_color='#E2E8F0',
-                    xaxis_title="Total Spend (₹)",
-                    yaxis_title=""
-                )
-                st.plotly_chart(fig_top_vendors, use_container_width=True)
+            top_vendors = summary_data.get("top_vendors", [])
+            if top_vendors:
+                st.plotly_chart(_bar_top5(top_vendors), use_container_width=True)
             else:
                 st.info("No vendor data to display.")
             st.markdown('</div>', unsafe_allow_html=True)
@@ -186,29 +279,7 @@ with tab1:
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.subheader("Monthly Spend Trend")
             
-            # Convert to DataFrame and sort
-            monthly_df = pd.DataFrame(list(monthly_spend_data.items()), columns=['Month', 'Total Spend'])
-            monthly_df['Month'] = pd.to_datetime(monthly_df['Month'])
-            monthly_df = monthly_df.sort_values('Month')
-            
-            # Calculate 3-month moving average
-            monthly_df['Moving Average (3M)'] = monthly_df['Total Spend'].rolling(window=3, min_periods=1).mean()
-
-            # Create plot with new 'Deep Ocean' color scheme and dark theme layout
-            fig = px.line(monthly_df, x='Month', y=['Total Spend', 'Moving Average (3M)'], 
-                          title="Monthly Expenditure and Trend", markers=True,
-                          color_discrete_map={
-                              'Total Spend': '#3498DB', # Peter River Blue
-                              'Moving Average (3M)': '#1ABC9C' # Turquoise
-                          })
-            fig.update_layout(
-                yaxis_title="Total Spend (₹)", 
-                legend_title_text='',
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font_color='#E2E8F0'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(_line_monthly(monthly_spend_data), use_container_width=True)
             
             st.markdown('</div>', unsafe_allow_html=True)
         else:
@@ -220,25 +291,40 @@ with tab1:
     else:
         st.info("No receipts found. Upload a receipt to see your dashboard.")
 
-    # Export buttons
+    # Export buttons: an export is only fetched once the user asks for it, and
+    # a download is offered only for a successfully fetched file
     st.write("Export Data:")
     col1, col2 = st.columns(2)
-    col1.download_button(
-        "Download as CSV",
-        data=requests.get(f"{API_BASE_URL}/receipts/export-csv").content,
-        file_name="receipts_export.csv",
-        mime="text/csv"
-    )
-    col2.download_button(
-        "Download as JSON",
-        data=requests.get(f"{API_BASE_URL}/receipts/export-json").content,
-        file_name="receipts_export.json",
-        mime="application/json"
-    )
+    if col1.button("Prepare CSV"):
+        blob = get_export_csv()
+        if blob is not None:
+            st.session_state["csv_blob"] = blob
+        else:
+            st.session_state.pop("csv_blob", None)
+    if "csv_blob" in st.session_state:
+        col1.download_button(
+            "Download as CSV",
+            data=st.session_state["csv_blob"],
+            file_name="receipts_export.csv",
+            mime="text/csv"
+        )
+    if col2.button("Prepare JSON"):
+        blob = get_export_json()
+        if blob is not None:
+            st.session_state["json_blob"] = blob
+        else:
+            st.session_state.pop("json_blob", None)
+    if "json_blob" in st.session_state:
+        col2.download_button(
+            "Download as JSON",
+            data=st.session_state["json_blob"],
+            file_name="receipts_export.json",
+            mime="application/json"
+        )
 
 
 # --- Tab 2: Upload New Receipt ---
-with tab2:
+if active_tab == TAB_UPLOAD:
     st.header("Upload a Receipt or Bill")
     uploaded_file = st.file_uploader(
         "Select a file (.jpg, .png, .pdf, .txt)",
@@ -250,14 +336,19 @@ with tab2:
         st.image(uploaded_file, caption="Preview (first page for PDF)", use_column_width=False, width=300)
 
         if st.button("Process and Save Receipt"):
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+            # Hand over the file object itself (rewound, since the preview read it)
+            # instead of a getvalue() copy of its contents
+            uploaded_file.seek(0)
+            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
             
             with st.spinner("🚀 Analyzing file... This may take a moment."):
                 try:
-                    response = requests.post(f"{API_BASE_URL}/receipts/upload", files=files)
+                    response = get_session().post(f"{API_BASE_URL}/receipts/upload", files=files)
                     
                     if response.status_code == 201:
                         data = response.json()
+                        # New receipts change every cached dataset
+                        invalidate_receipt_data()
                         st.success("✅ Receipt processed successfully!")
                         st.json(data)
                         st.info("Data saved to database. Check the Dashboard and Browse tabs.")
@@ -269,7 +360,7 @@ with tab2:
                     st.error(f"Failed to connect to the backend: {e}")
 
 # --- Tab 3: Browse & Search All Receipts ---
-with tab3:
+if active_tab == TAB_BROWSE:
     st.header("Browse & Search Receipts")
 
     # --- Search Form ---
@@ -302,13 +393,23 @@ with tab3:
         st.session_state.search_active = False
         st.session_state.search_results = []
 
-    # Sorting options
+    # Sorting options: applied together on submit, and kept in session state
+    # so the choice survives switching tabs
+    sort_fields, sort_orders = ["transaction_date", "total_amount", "vendor", "id"], ["desc", "asc"]
+    st.session_state.setdefault("sort_by", sort_fields[0])
+    st.session_state.setdefault("sort_order", sort_orders[0])
     st.markdown("#### Sort Options")
-    col_sort1, col_sort2 = st.columns(2)
-    with col_sort1:
-        sort_by = st.selectbox("Sort by", ["transaction_date", "total_amount", "vendor", "id"], index=0)
-    with col_sort2:
-        sort_order = st.selectbox("Order", ["desc", "asc"], index=0)
+    with st.form(key="sort_form"):
+        col_sort1, col_sort2 = st.columns(2)
+        with col_sort1:
+            selected_sort_by = st.selectbox("Sort by", sort_fields, index=sort_fields.index(st.session_state.sort_by))
+        with col_sort2:
+            selected_sort_order = st.selectbox("Order", sort_orders, index=sort_orders.index(st.session_state.sort_order))
+        if st.form_submit_button(label="Apply"):
+            st.session_state.sort_by = selected_sort_by
+            st.session_state.sort_order = selected_sort_order
+            st.session_state.receipts_page = 1
+    sort_by, sort_order = st.session_state.sort_by, st.session_state.sort_order
 
     # Determine which receipts to display
     if st.session_state.search_active:
@@ -316,42 +417,41 @@ with tab3:
         receipts_to_display = st.session_state.search_results
     else:
         st.subheader("All Processed Receipts")
-        receipts_to_display = get_all_receipts(sort_by, sort_order)
+        page = st.number_input("Page", min_value=1, step=1, key="receipts_page")
+        receipts_to_display = get_all_receipts(sort_by, sort_order, page)
 
     if receipts_to_display:
-        # Create a header
-        header_cols = st.columns([1, 3, 2, 2, 1])
-        header_cols[0].write("**ID**")
-        header_cols[1].write("**Vendor**")
-        header_cols[2].write("**Date**")
-        header_cols[3].write("**Amount**")
-        header_cols[4].write("**Actions**")
-
-        st.markdown("---")
-
-        for receipt in receipts_to_display:
-            col1, col2, col3, col4, col5 = st.columns([1, 3, 2, 2, 1])
-            with col1:
-                st.write(receipt['id'])
-            with col2:
-                st.write(receipt['vendor'])
-            with col3:
-                st.write(receipt['transaction_date'])
-            with col4:
-                st.write(f"₹{receipt['total_amount']:.2f}")
-            with col5:
-                if st.button("Delete", key=f"delete_{receipt['id']}"):
-                    try:
-                        response = requests.delete(f"{API_BASE_URL}/receipts/{receipt['id']}")
-                        if response.status_code == 200:
-                            st.success(f"Receipt ID {receipt['id']} deleted.")
-                            st.rerun()
-                        else:
-                            st.error(f"Error deleting receipt: {response.text}")
-                    except requests.exceptions.RequestException as e:
-                        st.error(f"API connection error: {e}")
+        import pandas as pd
+
+        receipts_df = pd.DataFrame.from_records(receipts_to_display)[["id", "vendor", "transaction_date", "total_amount"]]
+        st.dataframe(
+            receipts_df.style.format({"total_amount": "₹{:.2f}"}),
+            column_config={"id": "ID", "vendor": "Vendor", "transaction_date": "Date", "total_amount": "Amount"},
+            hide_index=True,
+            use_container_width=True
+        )
+
+        # --- Delete selected receipts ---
+        receipt_labels = {r['id']: f"{r['id']} · {r['vendor']} · ₹{r['total_amount']:.2f}" for r in receipts_to_display}
+        to_delete = st.multiselect("Select receipts to delete", list(receipt_labels), format_func=receipt_labels.get)
+        if st.button("Delete selected", disabled=not to_delete):
+            try:
+                session = get_session()
+                responses = list(get_pool().map(lambda receipt_id: session.delete(f"{API_BASE_URL}/receipts/{receipt_id}"), to_delete))
+                failed = [response for response in responses if response.status_code != 200]
+                if len(failed) < len(responses):
+                    invalidate_receipt_data()
+                if failed:
+                    st.error(f"Error deleting receipt: {failed[0].text}")
+                else:
+                    st.success(f"Deleted {len(to_delete)} receipt(s).")
+                    st.rerun()
+            except requests.exceptions.RequestException as e:
+                st.error(f"API connection error: {e}")
     else:
         if st.session_state.search_active:
             st.info("No receipts found matching your search criteria.")
+        elif page > 1:
+            st.info("No receipts on this page.")
         else:
             st.info("No receipts found in the database. Use the 'Upload' tab to add some!")